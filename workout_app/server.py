@@ -1,4 +1,4 @@
-Personal Fitness Tracker & Coach Backend (FastAPI version)
+"""Personal Fitness Tracker & Coach Backend (FastAPI version)
 =======================================================
 
 This module provides a FastAPI web application that serves both a REST API and
@@ -19,82 +19,323 @@ proper HTTPS configuration for security when exposing the server publicly.
 """
 
 import os
-import json
+import queue
+import hashlib
+import threading
 import datetime
 import sqlite3
-from typing import Dict, List
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Literal, Optional, Tuple, TypeVar
 
+import orjson
 import requests
-from fastapi import FastAPI, HTTPException, Request, Response
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel, Field, field_validator
 
 
 DATABASE = os.path.join(os.path.dirname(__file__), 'workouts.db')
 
+# Number of SQLite connections kept open for the lifetime of the app
+DB_POOL_SIZE = 8
+
+# Stored in PRAGMA user_version; bump it whenever init_db changes the schema
+SCHEMA_VERSION = 1
+
+# Recommendations keyed by a hash of the workout history they were built from
+RECOMMENDATION_CACHE_SIZE = 256
+RECOMMENDATION_CACHE_TTL = 3600
+
+T = TypeVar('T')
+
 
 
 def get_db_connection() -> sqlite3.Connection:
-    """Return a new database connection with a Row factory for dict‑like access."""
-    conn = sqlite3.connect(DATABASE)
+    """Return a new database connection with a Row factory for dict‑like access.
+
+    The connection is tuned for concurrent use: WAL journaling lets readers
+    proceed while a write is in progress, and the larger page cache and
+    memory map keep hot pages resident for as long as the connection lives.
+    """
+    conn = sqlite3.connect(DATABASE, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-64000')
+    conn.execute('PRAGMA mmap_size=268435456')
     return conn
 
 
 
-def init_db() -> None:
-    """Initialize the database if it doesn't already exist."""
-    with get_db_connection() as db:
-        # workouts table holds definitions of both strength and cardio exercises
-        db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS workouts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                type TEXT NOT NULL CHECK (type IN ('strength', 'cardio')),
-                sets INTEGER,
-                reps INTEGER,
-                weight REAL,
-                distance REAL,
-                duration REAL
-            )
-            """
-        )
-        # workout_logs table holds completed sessions
-        db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS workout_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                workout_id INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                log_data TEXT NOT NULL,
-                comment TEXT,
-                FOREIGN KEY (workout_id) REFERENCES workouts (id) ON DELETE CASCADE
-            )
-            """
-        )
-        # schedule table maps dates to workouts
-        db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS schedule (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                workout_id INTEGER NOT NULL,
-                FOREIGN KEY (workout_id) REFERENCES workouts (id) ON DELETE CASCADE
-            )
-            """
-        )
-        db.commit()
+class ConnectionPool:
+    """A fixed-size pool of pre-opened SQLite connections.
+
+    Opening a connection per request throws away SQLite's page cache each
+    time, so the app instead borrows a long-lived connection for the
+    duration of a request and hands it back afterwards.
+    """
+
+    def __init__(self, size: int = DB_POOL_SIZE) -> None:
+        self.size = size
+        self._connections: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=size)
+
+    def open(self) -> None:
+        """Fill the pool with freshly configured connections."""
+        for _ in range(self.size):
+            self._connections.put(get_db_connection())
+
+    def close(self) -> None:
+        """Close every connection currently held by the pool."""
+        while True:
+            try:
+                conn = self._connections.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+    @contextmanager
+    def acquire(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection, blocking until one is free."""
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            # Never hand a half-finished transaction to the next borrower
+            if conn.in_transaction:
+                conn.rollback()
+            self._connections.put(conn)
+
+
+pool = ConnectionPool()
 
 
 
-def fetch_ai_recommendation(history: List[Dict]) -> str:
+async def run_db(fn: Callable[[sqlite3.Connection], T]) -> T:
+    """Run ``fn`` with a pooled connection on a worker thread.
+
+    sqlite3 calls block, so doing them directly inside an ``async def``
+    endpoint would stall the event loop for every other request.
+    """
+    def call() -> T:
+        with pool.acquire() as conn:
+            return fn(conn)
+    return await run_in_threadpool(call)
+
+
+
+def fetch_dicts(conn: sqlite3.Connection, sql: str) -> List[Dict]:
+    """Run ``sql`` and return every row as a plain dict.
+
+    Zipping the column names with bare tuples once per row is cheaper than
+    copying each key out of a ``sqlite3.Row``.
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(sql)
+    columns = [description[0] for description in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+
+SCHEMA_SQL = f"""
+BEGIN IMMEDIATE;
+-- workouts table holds definitions of both strength and cardio exercises
+CREATE TABLE IF NOT EXISTS workouts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('strength', 'cardio')),
+    sets INTEGER,
+    reps INTEGER,
+    weight REAL,
+    distance REAL,
+    duration REAL
+);
+-- workout_logs table holds completed sessions
+CREATE TABLE IF NOT EXISTS workout_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    workout_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    log_data TEXT NOT NULL,
+    comment TEXT,
+    FOREIGN KEY (workout_id) REFERENCES workouts (id) ON DELETE CASCADE
+);
+-- schedule table maps dates to workouts
+CREATE TABLE IF NOT EXISTS schedule (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    workout_id INTEGER NOT NULL,
+    FOREIGN KEY (workout_id) REFERENCES workouts (id) ON DELETE CASCADE
+);
+-- history is listed newest first and joined back to its workout
+CREATE INDEX IF NOT EXISTS idx_logs_date ON workout_logs (date DESC);
+CREATE INDEX IF NOT EXISTS idx_logs_workout ON workout_logs (workout_id);
+-- at most one workout per day; keep the latest entry from older databases
+DELETE FROM schedule WHERE id NOT IN (SELECT MAX(id) FROM schedule GROUP BY date);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_schedule_date ON schedule (date);
+-- gather planner statistics now that the indexes exist
+ANALYZE;
+PRAGMA user_version = {SCHEMA_VERSION};
+COMMIT;
+"""
+
+
+
+def init_db() -> None:
+    """Create or upgrade the schema unless it is already at SCHEMA_VERSION.
+
+    With several uvicorn workers only the first to get past the
+    ``user_version`` check does any DDL. Workers racing past it together
+    are serialised by ``BEGIN IMMEDIATE``, and every statement in the
+    script is safe to repeat.
+    """
+    db = get_db_connection()
+    try:
+        if db.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            db.executescript(SCHEMA_SQL)
+    finally:
+        db.close()
+
+
+
+recommendation_cache: TTLCache = TTLCache(
+    maxsize=RECOMMENDATION_CACHE_SIZE, ttl=RECOMMENDATION_CACHE_TTL
+)
+recommendation_cache_lock = threading.Lock()
+
+# Keep-alive session so repeat calls to OpenAI skip the TCP and TLS handshake
+openai_session = requests.Session()
+openai_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# Sent unchanged as the first message of every request. On gpt-4o and newer
+# models OpenAI caches prompt prefixes of 1024 tokens or more, so the
+# coaching guidelines and examples below are deliberately long and must stay
+# byte-identical between calls (no dates, names or other per-request values).
+SYSTEM_PROMPT = (
+    "You are a helpful personal training assistant. Your job is to analyse "
+    "workout history and suggest when to increase weight or adjust volume. "
+    "Provide succinct, actionable advice tailored to the user's recent "
+    "performance.\n"
+    "\n"
+    "The user logs two kinds of workouts. Strength workouts are recorded as a "
+    "list of completed sets, each with a number of repetitions and a weight in "
+    "kilograms. Cardio workouts are running sessions recorded as a distance in "
+    "kilometres and a duration in minutes. The history you receive lists up to "
+    "the ten most recent sessions, oldest first, one per line. A value of '?' "
+    "means the user did not record it; never invent missing numbers.\n"
+    "\n"
+    "Coaching guidelines for strength work:\n"
+    "- Progress one variable at a time. Add repetitions first; once every set "
+    "reaches the top of the rep range, add weight and drop back to the bottom "
+    "of the range.\n"
+    "- For lower-body lifts such as squats and deadlifts, suggest increases of "
+    "2.5 to 5 kg. For upper-body lifts such as bench press, overhead press and "
+    "rows, suggest 1 to 2.5 kg.\n"
+    "- Only recommend a weight increase when the user completed all sets at the "
+    "current weight in at least two consecutive sessions of that exercise.\n"
+    "- If repetitions dropped across sets within a session, or fell compared "
+    "with the previous session at the same weight, hold the weight and "
+    "consolidate before progressing.\n"
+    "- If performance has stalled or regressed for three or more sessions, "
+    "suggest a deload of roughly 10 percent for one week, then build back up.\n"
+    "- Do not recommend adding sets unless the user is consistently hitting "
+    "every target and training the exercise at most twice a week.\n"
+    "- Treat a single missed repetition on the final set as normal variation, "
+    "not a reason to reduce the weight.\n"
+    "- When the same exercise appears with different weights, compare "
+    "sessions at the heaviest weight the user has completed.\n"
+    "\n"
+    "Coaching guidelines for running:\n"
+    "- Work out the pace in minutes per kilometre from distance and duration "
+    "when both are present, and refer to it when discussing progress.\n"
+    "- Increase weekly running distance by no more than about 10 percent.\n"
+    "- Change either distance or pace in a given week, not both.\n"
+    "- If the pace is getting slower over several runs at a similar distance, "
+    "suggest an easier week or an extra rest day before pushing further.\n"
+    "- Encourage mostly easy runs at a conversational pace, with at most one "
+    "harder session a week.\n"
+    "- For runs longer than about 10 km, prioritise consistent distance over "
+    "faster pace, and suggest fuelling and hydration if durations exceed an "
+    "hour.\n"
+    "\n"
+    "General rules:\n"
+    "- Base every recommendation on the history provided. If there is too "
+    "little data to judge an exercise, say so and suggest repeating the "
+    "current load.\n"
+    "- Mention each exercise in the history at most once, by name.\n"
+    "- Keep the whole answer under 150 words, as a short bulleted list with "
+    "one bullet per exercise followed by one line of general advice.\n"
+    "- Do not give medical advice. If the history suggests pain, injury or "
+    "very long gaps between sessions, recommend caution and a conversation "
+    "with a qualified professional.\n"
+    "- Use kilograms and kilometres, matching the units in the history.\n"
+    "\n"
+    "Example history:\n"
+    "On 2024-03-01 you performed Squat with sets: 5 reps @ 80kg, 5 reps @ 80kg, "
+    "5 reps @ 80kg.\n"
+    "On 2024-03-02 you ran 5 km in 30 minutes for the workout Easy Run.\n"
+    "On 2024-03-04 you performed Squat with sets: 5 reps @ 80kg, 5 reps @ 80kg, "
+    "5 reps @ 80kg.\n"
+    "On 2024-03-06 you ran 5 km in 29 minutes for the workout Easy Run.\n"
+    "Example answer:\n"
+    "- Squat: all sets completed at 80 kg in two sessions in a row. Move to "
+    "82.5 kg for 3x5 next time.\n"
+    "- Easy Run: pace improved from 6:00 to 5:48 per km. Keep the pace and "
+    "extend the run to 5.5 km.\n"
+    "Progress is steady; keep at least one rest day between squat sessions.\n"
+    "\n"
+    "Example history:\n"
+    "On 2024-05-10 you performed Bench Press with sets: 8 reps @ 60kg, 7 reps "
+    "@ 60kg, 5 reps @ 60kg.\n"
+    "On 2024-05-13 you performed Bench Press with sets: 8 reps @ 60kg, 6 reps "
+    "@ 60kg, 5 reps @ 60kg.\n"
+    "On 2024-05-15 you ran 8 km in ? minutes for the workout Long Run.\n"
+    "Example answer:\n"
+    "- Bench Press: reps are falling off in later sets. Stay at 60 kg until "
+    "you complete 3x8, and rest a little longer between sets.\n"
+    "- Long Run: no duration was logged, so pace cannot be judged. Record the "
+    "time next run and keep the distance at 8 km.\n"
+    "Consolidate this week before adding load.\n"
+    "\n"
+    "Example history:\n"
+    "On 2024-06-03 you ran 10 km in 62 minutes for the workout Tempo Run.\n"
+    "On 2024-06-07 you ran 10 km in 64 minutes for the workout Tempo Run.\n"
+    "On 2024-06-11 you ran 10 km in 66 minutes for the workout Tempo Run.\n"
+    "On 2024-06-12 you performed Overhead Press with sets: 5 reps @ 40kg, 5 "
+    "reps @ 40kg, 5 reps @ 40kg.\n"
+    "Example answer:\n"
+    "- Tempo Run: pace has slowed from 6:12 to 6:36 per km over three runs. "
+    "Take an easy week at 8 km before returning to 10 km.\n"
+    "- Overhead Press: first logged session at 40 kg with all sets complete. "
+    "Repeat 40 kg once more, then add 1 kg.\n"
+    "Slowing runs often mean accumulated fatigue, so prioritise sleep and an "
+    "extra rest day.\n"
+    "\n"
+    "Example history:\n"
+    "On 2024-07-01 you performed Deadlift with sets: 5 reps @ 120kg.\n"
+    "Example answer:\n"
+    "- Deadlift: one session is not enough to judge progress. Repeat 120 kg "
+    "for 5 reps and log how it felt.\n"
+    "Log a few more sessions so future advice can be more specific."
+)
+
+
+
+def fetch_ai_recommendation(history: str) -> str:
     """Request an AI recommendation from OpenAI based on workout history.
 
-    See the Flask version of this function for details. It constructs a
-    structured prompt and calls the Chat Completions API. The API key must
-    be supplied via the OPENAI_API_KEY environment variable.
+    ``history`` is the newline-separated session summary produced by the
+    recommendation query. It constructs a structured prompt and calls the
+    Chat Completions API. The API key must be supplied via the
+    OPENAI_API_KEY environment variable. Identical histories produce
+    identical prompts, so successful answers are cached by a hash of the
+    history.
     """
     api_key = os.environ.get('OPENAI_API_KEY')
     if not api_key:
@@ -102,49 +343,28 @@ def fetch_ai_recommendation(history: List[Dict]) -> str:
             "OpenAI API key not set. Please set the OPENAI_API_KEY environment"
             " variable to receive recommendations."
         )
-    system_prompt = (
-        "You are a helpful personal training assistant. Your job is to analyse "
-        "workout history and suggest when to increase weight or adjust volume. "
-        "Provide succinct, actionable advice tailored to the user's recent "
-        "performance."
-    )
-    history_snippet = []
-    for entry in history[-10:]:
-        w_type = entry.get('type')
-        if w_type == 'strength':
-            sets = entry.get('sets_completed', [])
-            sets_str = ", ".join([
-                f"{s['reps']} reps @ {s['weight']}kg" for s in sets
-            ])
-            history_snippet.append(
-                f"On {entry['date']} you performed {entry['name']} with sets: {sets_str}."
-            )
-        elif w_type == 'cardio':
-            history_snippet.append(
-                f"On {entry['date']} you ran {entry.get('distance', '?')} km in "
-                f"{entry.get('duration', '?')} minutes for the workout {entry['name']}."
-            )
-        else:
-            history_snippet.append(
-                f"On {entry['date']} you completed {entry['name']}."
-            )
+    cache_key = hashlib.blake2b(history.encode()).hexdigest()
+    with recommendation_cache_lock:
+        cached = recommendation_cache.get(cache_key)
+    if cached is not None:
+        return cached
     user_message = (
-        "Here is my recent workout history:\n" + "\n".join(history_snippet) +
+        "Here is my recent workout history:\n" + history +
         "\nBased on this, please recommend whether I should increase the weight "
         "or intensity for each exercise, and provide suggestions for progression "
         "in both strength and running workouts."
     )
     payload = {
-        "model": "gpt-3.5-turbo",
+        "model": "gpt-4o-mini",
         "messages": [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_message},
         ],
         "temperature": 0.5,
         "max_tokens": 200,
     }
     try:
-        response = requests.post(
+        response = openai_session.post(
             "https://api.openai.com/v1/chat/completions",
             headers={
                 "Authorization": f"Bearer {api_key}",
@@ -156,223 +376,303 @@ def fetch_ai_recommendation(history: List[Dict]) -> str:
         response.raise_for_status()
         data = response.json()
         if data.get('choices'):
-            return data['choices'][0]['message']['content'].strip()
+            recommendation = data['choices'][0]['message']['content'].strip()
+            with recommendation_cache_lock:
+                recommendation_cache[cache_key] = recommendation
+            return recommendation
         return "No recommendation available."
     except Exception as exc:
         return f"Error requesting recommendation: {exc}"
 
 
-# Initialize DB once
-init_db()
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    init_db()
+    pool.open()
+    app.state.pages = render_pages()
+    yield
+    pool.close()
+    openai_session.close()
+
 
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
 
 # Mount static files (CSS/JS)
 app.mount('/static', StaticFiles(directory=os.path.join(os.path.dirname(__file__), 'static')), name='static')
 
-# Configure templates
+# Configure templates; they only change on deploy, so skip the per-render
+# freshness check
 templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), 'templates'))
+templates.env.auto_reload = False
+
+PAGE_TEMPLATES = ('index.html', 'workouts.html', 'schedule.html', 'history.html')
+
+
+def render_pages() -> Dict[str, bytes]:
+    """Render every page once; none of them depend on the request.
+
+    Restart the server to pick up template changes.
+    """
+    return {
+        name: templates.get_template(name).render().encode('utf-8')
+        for name in PAGE_TEMPLATES
+    }
 
 
 @app.get('/', response_class=HTMLResponse)
-async def index(request: Request):
-    return templates.TemplateResponse('index.html', {'request': request})
+async def index():
+    return HTMLResponse(app.state.pages['index.html'])
 
 
 @app.get('/workouts', response_class=HTMLResponse)
-async def workouts_page(request: Request):
-    return templates.TemplateResponse('workouts.html', {'request': request})
+async def workouts_page():
+    return HTMLResponse(app.state.pages['workouts.html'])
 
 
 @app.get('/schedule', response_class=HTMLResponse)
-async def schedule_page(request: Request):
-    return templates.TemplateResponse('schedule.html', {'request': request})
+async def schedule_page():
+    return HTMLResponse(app.state.pages['schedule.html'])
 
 
 @app.get('/history', response_class=HTMLResponse)
-async def history_page(request: Request):
-    return templates.TemplateResponse('history.html', {'request': request})
+async def history_page():
+    return HTMLResponse(app.state.pages['history.html'])
 
 
 # API endpoints
 
+class WorkoutIn(BaseModel):
+    """A new strength or cardio workout definition."""
+
+    name: str
+    type: Literal['strength', 'cardio']
+    sets: Optional[int] = None
+    reps: Optional[int] = None
+    weight: Optional[float] = None
+    distance: Optional[float] = None
+    duration: Optional[float] = None
+
+
+class WorkoutUpdate(BaseModel):
+    """A partial workout update; only the fields sent are changed."""
+
+    name: Optional[str] = None
+    type: Optional[Literal['strength', 'cardio']] = None
+    sets: Optional[int] = None
+    reps: Optional[int] = None
+    weight: Optional[float] = None
+    distance: Optional[float] = None
+    duration: Optional[float] = None
+
+    @field_validator('name', 'type')
+    @classmethod
+    def not_null(cls, value: Optional[str]) -> str:
+        # name and type may be left out but never cleared
+        if value is None:
+            raise ValueError('may not be null')
+        return value
+
+
+class ScheduleEntry(BaseModel):
+    """Plans a workout for a day, or clears the day when workout_id is missing."""
+
+    date: str = Field(min_length=1)
+    workout_id: Optional[int] = None
+
+
+class LogIn(BaseModel):
+    """A completed session; date defaults to today."""
+
+    workout_id: int = Field(gt=0)
+    log_data: Dict[str, Any]
+    comment: Optional[str] = None
+    date: Optional[str] = None
+
+
+@lru_cache(maxsize=None)
+def workout_update_sql(columns: Tuple[str, ...]) -> str:
+    """Return the UPDATE statement for one combination of changed columns.
+
+    Columns arrive in model field order, so each combination always maps to
+    the same SQL text and sqlite3 can reuse its prepared statement.
+    """
+    assignments = ', '.join(f'{column}=?' for column in columns)
+    return f'UPDATE workouts SET {assignments} WHERE id=?'
+
+
 @app.get('/api/workouts')
 async def api_get_workouts() -> List[Dict]:
-    conn = get_db_connection()
-    rows = conn.execute('SELECT * FROM workouts').fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    return await run_db(lambda conn: fetch_dicts(
+        conn,
+        'SELECT id, name, type, sets, reps, weight, distance, duration FROM workouts',
+    ))
 
 
 @app.post('/api/workouts')
-async def api_create_workout(workout: Dict) -> Dict:
-    required = {'name', 'type'}
-    if not required.issubset(workout.keys()):
-        raise HTTPException(status_code=400, detail='Invalid workout definition')
-    name = workout['name']
-    wtype = workout['type']
-    if wtype not in ('strength', 'cardio'):
-        raise HTTPException(status_code=400, detail='Type must be strength or cardio')
-    sets = workout.get('sets')
-    reps = workout.get('reps')
-    weight = workout.get('weight')
-    distance = workout.get('distance')
-    duration = workout.get('duration')
-    conn = get_db_connection()
-    with conn:
-        cur = conn.execute(
-            'INSERT INTO workouts (name, type, sets, reps, weight, distance, duration) '
-            'VALUES (?, ?, ?, ?, ?, ?, ?)',
-            (name, wtype, sets, reps, weight, distance, duration),
-        )
-        new_id = cur.lastrowid
-    conn.close()
+async def api_create_workout(workout: WorkoutIn) -> Dict:
+
+    def insert(conn: sqlite3.Connection) -> int:
+        with conn:
+            cur = conn.execute(
+                'INSERT INTO workouts (name, type, sets, reps, weight, distance, duration) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    workout.name, workout.type, workout.sets, workout.reps,
+                    workout.weight, workout.distance, workout.duration,
+                ),
+            )
+            return cur.lastrowid
+
+    new_id = await run_db(insert)
     return {'id': new_id}
 
 
 @app.get('/api/workouts/{workout_id}')
 async def api_get_workout(workout_id: int):
-    conn = get_db_connection()
-    row = conn.execute('SELECT * FROM workouts WHERE id=?', (workout_id,)).fetchone()
-    conn.close()
+    row = await run_db(
+        lambda conn: conn.execute('SELECT * FROM workouts WHERE id=?', (workout_id,)).fetchone()
+    )
     if not row:
         raise HTTPException(status_code=404, detail='Workout not found')
     return dict(row)
 
 
 @app.put('/api/workouts/{workout_id}')
-async def api_update_workout(workout_id: int, updates: Dict):
-    allowed_keys = {'name', 'type', 'sets', 'reps', 'weight', 'distance', 'duration'}
-    if not any(k in updates for k in allowed_keys):
+async def api_update_workout(workout_id: int, updates: WorkoutUpdate):
+    changes = updates.model_dump(exclude_unset=True)
+    if not changes:
         raise HTTPException(status_code=400, detail='No valid fields provided')
-    conn = get_db_connection()
-    fields = []
-    values = []
-    for key in allowed_keys:
-        if key in updates:
-            fields.append(f"{key}=?")
-            values.append(updates[key])
-    values.append(workout_id)
-    with conn:
-        conn.execute(f"UPDATE workouts SET {', '.join(fields)} WHERE id=?", tuple(values))
-    conn.close()
+    sql = workout_update_sql(tuple(changes))
+    values = (*changes.values(), workout_id)
+
+    def update(conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute(sql, values)
+
+    await run_db(update)
     return {'status': 'updated'}
 
 
 @app.delete('/api/workouts/{workout_id}')
 async def api_delete_workout(workout_id: int):
-    conn = get_db_connection()
-    with conn:
-        conn.execute('DELETE FROM workouts WHERE id=?', (workout_id,))
-    conn.close()
+
+    def delete(conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute('DELETE FROM workouts WHERE id=?', (workout_id,))
+
+    await run_db(delete)
     return {'status': 'deleted'}
 
 
 @app.get('/api/schedule')
 async def api_get_schedule() -> List[Dict]:
-    conn = get_db_connection()
-    rows = conn.execute(
+    return await run_db(lambda conn: fetch_dicts(
+        conn,
         'SELECT schedule.id, schedule.date, schedule.workout_id, workouts.name, workouts.type, '
         'workouts.sets, workouts.reps, workouts.weight '
         'FROM schedule JOIN workouts ON schedule.workout_id = workouts.id '
-        'ORDER BY schedule.date'
-    ).fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+        'ORDER BY schedule.date',
+    ))
 
 
 @app.post('/api/schedule')
-async def api_set_schedule(entries: List[Dict]):
-    # entries should be list of {date, workout_id}
-    conn = get_db_connection()
-    with conn:
-        dates = [e['date'] for e in entries if 'date' in e]
-        if dates:
-            placeholders = ','.join('?' for _ in dates)
-            conn.execute(f'DELETE FROM schedule WHERE date IN ({placeholders})', tuple(dates))
-        for entry in entries:
-            date_str = entry.get('date')
-            workout_id = entry.get('workout_id')
-            if date_str and workout_id:
-                conn.execute('INSERT INTO schedule (date, workout_id) VALUES (?, ?)', (date_str, workout_id))
-    conn.close()
+async def api_set_schedule(entries: List[ScheduleEntry]):
+    rows = [(e.date, e.workout_id) for e in entries if e.workout_id]
+    cleared = [e.date for e in entries if not e.workout_id]
+
+    def upsert(conn: sqlite3.Connection) -> None:
+        with conn:
+            if cleared:
+                placeholders = ','.join('?' for _ in cleared)
+                conn.execute(f'DELETE FROM schedule WHERE date IN ({placeholders})', tuple(cleared))
+            conn.executemany(
+                'INSERT INTO schedule (date, workout_id) VALUES (?, ?) '
+                'ON CONFLICT (date) DO UPDATE SET workout_id=excluded.workout_id',
+                rows,
+            )
+
+    await run_db(upsert)
     return {'status': 'scheduled'}
 
 
 @app.delete('/api/schedule')
 async def api_clear_schedule():
-    conn = get_db_connection()
-    with conn:
-        conn.execute('DELETE FROM schedule')
-    conn.close()
+
+    def clear(conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute('DELETE FROM schedule')
+
+    await run_db(clear)
     return {'status': 'cleared'}
 
 
 @app.get('/api/logs')
-async def api_get_logs() -> List[Dict]:
-    conn = get_db_connection()
-    rows = conn.execute(
-        'SELECT workout_logs.id, workout_logs.date, workout_logs.log_data, workout_logs.comment, '
-        'workouts.name, workouts.type '
+async def api_get_logs() -> Response:
+    # log_data is stored as JSON text, so splice it into the response as-is
+    # instead of parsing it only to serialise it again; anything that is not
+    # valid JSON is quoted and returned as a plain string
+    results = await run_db(lambda conn: fetch_dicts(
+        conn,
+        'SELECT workout_logs.id, workout_logs.date, '
+        'CASE WHEN json_valid(workout_logs.log_data) THEN workout_logs.log_data '
+        'ELSE json_quote(workout_logs.log_data) END AS log_data, '
+        'workout_logs.comment, workouts.name, workouts.type '
         'FROM workout_logs JOIN workouts ON workout_logs.workout_id = workouts.id '
-        'ORDER BY workout_logs.date DESC'
-    ).fetchall()
-    conn.close()
-    results = []
-    for row in rows:
-        entry = dict(row)
-        try:
-            entry['log_data'] = json.loads(entry['log_data'])
-        except Exception:
-            pass
-        results.append(entry)
-    return results
+        'ORDER BY workout_logs.date DESC',
+    ))
+    for entry in results:
+        entry['log_data'] = orjson.Fragment(entry['log_data'])
+    return Response(orjson.dumps(results), media_type='application/json')
 
 
 @app.post('/api/logs')
-async def api_create_log(log_entry: Dict):
-    workout_id = log_entry.get('workout_id')
-    log_data = log_entry.get('log_data')
-    comment = log_entry.get('comment')
-    date_str = log_entry.get('date') or datetime.date.today().isoformat()
-    if not workout_id or not isinstance(log_data, dict):
-        raise HTTPException(status_code=400, detail='Invalid log entry')
-    conn = get_db_connection()
-    with conn:
-        conn.execute(
-            'INSERT INTO workout_logs (workout_id, date, log_data, comment) VALUES (?, ?, ?, ?)',
-            (workout_id, date_str, json.dumps(log_data), comment),
-        )
-    conn.close()
+async def api_create_log(log_entry: LogIn):
+    date_str = log_entry.date or datetime.date.today().isoformat()
+    try:
+        log_data = orjson.dumps(log_entry.log_data).decode()
+    except orjson.JSONEncodeError as exc:
+        # e.g. integers wider than 64 bits, which orjson cannot encode
+        raise HTTPException(status_code=422, detail=f'Invalid log_data: {exc}')
+
+    def insert(conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute(
+                'INSERT INTO workout_logs (workout_id, date, log_data, comment) VALUES (?, ?, ?, ?)',
+                (log_entry.workout_id, date_str, log_data, log_entry.comment),
+            )
+
+    await run_db(insert)
+    # a new session changes the history every cached answer was based on
+    with recommendation_cache_lock:
+        recommendation_cache.clear()
     return {'status': 'logged'}
 
 
 @app.get('/api/recommendation')
 async def api_get_recommendation():
-    conn = get_db_connection()
-    rows = conn.execute(
-        'SELECT workout_logs.date, workouts.name, workouts.type, workout_logs.log_data '
-        'FROM workout_logs JOIN workouts ON workout_logs.workout_id = workouts.id '
-        'ORDER BY workout_logs.date DESC LIMIT 10'
-    ).fetchall()
-    conn.close()
-    history_data = []
-    for row in reversed(rows):
-        entry = {
-            'date': row['date'],
-            'name': row['name'],
-            'type': row['type'],
-        }
-        try:
-            log_info = json.loads(row['log_data'])
-            if row['type'] == 'strength':
-                entry['sets_completed'] = log_info.get('sets_completed', [])
-            elif row['type'] == 'cardio':
-                entry['distance'] = log_info.get('distance')
-                entry['duration'] = log_info.get('duration')
-        except Exception:
-            pass
-        history_data.append(entry)
-    recommendation = fetch_ai_recommendation(history_data)
+    # one prompt line for each of the ten most recent sessions, oldest first;
+    # unreadable log_data is treated as an empty object
+    rows = await run_db(lambda conn: conn.execute(
+        "SELECT CASE type "
+        "WHEN 'strength' THEN printf('On %s you performed %s with sets: %s.', date, name, "
+        "ifnull((SELECT group_concat(json_extract(value, '$.reps') || ' reps @ ' || "
+        "json_extract(value, '$.weight') || 'kg', ', ') "
+        "FROM json_each(log_data, '$.sets_completed')), '')) "
+        "WHEN 'cardio' THEN printf('On %s you ran %s km in %s minutes for the workout %s.', date, "
+        "ifnull(json_extract(log_data, '$.distance'), '?'), "
+        "ifnull(json_extract(log_data, '$.duration'), '?'), name) "
+        "ELSE printf('On %s you completed %s.', date, name) "
+        "END AS snippet "
+        "FROM ("
+        "SELECT workout_logs.date, workouts.name, workouts.type, "
+        "CASE WHEN json_valid(workout_logs.log_data) THEN workout_logs.log_data ELSE '{}' END AS log_data "
+        "FROM workout_logs JOIN workouts ON workout_logs.workout_id = workouts.id "
+        "ORDER BY workout_logs.date DESC LIMIT 10"
+        ") ORDER BY date ASC"
+    ).fetchall())
+    history = "\n".join(row['snippet'] for row in rows)
+    # the OpenAI call can take seconds, so keep it off the event loop
+    recommendation = await run_in_threadpool(fetch_ai_recommendation, history)
     return {'recommendation': recommendation}